@@ -1,24 +1,126 @@
 # app.py
 from flask import Flask, request, jsonify, redirect, session, url_for
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 import json
+import logging
+import re
+import threading
+import time
+from urllib.parse import urlencode
+from contextlib import contextmanager
 from functools import wraps
 import secrets
 import psycopg2
-# 🔐 Load Lead Capture Token from environment (set in DO or Replit secrets)
-import os
+from psycopg2.pool import ThreadedConnectionPool
 
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
+# LOG_LEVEL=DEBUG enables the full payload and response dumps
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(16))
+# Responses echo Clio payloads; skip sorting their keys on every jsonify()
+app.json.sort_keys = False
 
 # Configuration
 CLIO_CLIENT_ID = os.environ.get('CLIO_CLIENT_ID')
 CLIO_CLIENT_SECRET = os.environ.get('CLIO_CLIENT_SECRET')
 CLIO_REDIRECT_URI = 'https://ghl-clio-bridge-a-and-d-LawLeaders.replit.app/api/clio-callback'
 CLIO_AUTH_URL = 'https://app.clio.com/oauth/authorize'
+# Full authorization URL; every part is a process constant
+CLIO_AUTHORIZE_URL = f"{CLIO_AUTH_URL}?" + urlencode({
+    'response_type': 'code',
+    'client_id': CLIO_CLIENT_ID,
+    'redirect_uri': CLIO_REDIRECT_URI
+})
 CLIO_TOKEN_URL = 'https://app.clio.com/oauth/token'
 CLIO_API_BASE = 'https://app.clio.com/api/v4'
+CLIO_CONTACTS_URL = f'{CLIO_API_BASE}/contacts'
+CLIO_MATTERS_URL = f'{CLIO_API_BASE}/matters'
+CLIO_NOTES_URL = f'{CLIO_API_BASE}/notes'
+CLIO_CONTACT_MATTERS_URL = CLIO_API_BASE + '/contacts/{contact_id}/matters'
+# /matters statuses worth retrying on the contact-scoped endpoint; validation,
+# auth and permission errors (400/401/403/422) would fail there too
+CLIO_MATTER_FALLBACK_STATUSES = frozenset({404, 500, 502, 503, 504})
+
+# Clio timeouts as (connect, read): dead hosts fail fast, slow creates keep their full budget
+CLIO_CONNECT_TIMEOUT = 3.05
+CLIO_READ_TIMEOUT = 20
+CLIO_TIMEOUT = (CLIO_CONNECT_TIMEOUT, CLIO_READ_TIMEOUT)
+
+# Shared HTTP session for Clio so keep-alive TLS connections are reused across calls
+clio_session = requests.Session()
+clio_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=20))
+# Longest Retry-After (seconds) a webhook thread will sleep before retrying Clio
+CLIO_MAX_RETRY_AFTER = 5
+
+class CappedRetry(Retry):
+    """Retry that honours Retry-After but never sleeps longer than CLIO_MAX_RETRY_AFTER"""
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, CLIO_MAX_RETRY_AFTER)
+
+# API calls retry transient failures with jittered exponential backoff. Only connect
+# errors and 429/503 (request refused before processing) are retried, so creates are
+# never replayed
+CLIO_API_RETRY = CappedRetry(
+    total=3, connect=3, read=0, status=3,
+    backoff_factor=0.5,
+    backoff_jitter=0.3,
+    status_forcelist=(429, 503),
+    allowed_methods=frozenset({"GET", "POST"}),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+clio_session.mount(CLIO_API_BASE, HTTPAdapter(pool_connections=1, pool_maxsize=20, max_retries=CLIO_API_RETRY))
+# Every Clio endpoint answers in JSON; per-call headers only add auth / content type
+clio_session.headers.update({"Accept": "application/json"})
+
+# Postgres connection pool settings (the pool itself is created lazily per worker).
+# A thread never holds more than one connection, so the pool matches the gunicorn
+# thread count; WEB_CONCURRENCY x DB_POOL_MAX_CONN must stay below max_connections
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', '8'))
+DB_POOL_MAX_CONN = int(os.environ.get('DB_POOL_MAX_CONN', GUNICORN_THREADS))
+# The pool closes every connection returned above minconn, so keep one per
+# gunicorn thread or threaded workers reconnect on nearly every request
+DB_POOL_MIN_CONN = min(GUNICORN_THREADS, DB_POOL_MAX_CONN)
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+# In-process cache of the Clio token read from the database (seconds)
+CLIO_TOKEN_CACHE_TTL = 300
+_clio_token_cache = {"token": None, "cached_at": 0.0}
+
+# Remember when the standard matters endpoint rejects requests that the
+# contact-scoped endpoint accepts, so later matters skip the failing call
+_matter_endpoint_state = {"prefer_contact_scoped": False}
+
+# Circuit breaker: after repeated Clio 5xx/network failures, fail fast for a
+# cool-off window instead of pinning workers on 20s timeouts
+CLIO_BREAKER_THRESHOLD = 5
+CLIO_BREAKER_RESET_SECONDS = 30
+_clio_breaker = {"failures": 0, "opened_at": 0.0}
+_clio_breaker_lock = threading.Lock()
+
+# Trust/Will litigation keywords used by extract_practice_area
+TRUST_WILL_KEYWORDS = (
+    "trust litigation", "will litigation", "contest will", "contest trust",
+    "contested will", "contested trust", "trust contest", "will contest",
+    "vested rights", "trustee removal", "trust termination",
+    "probate", "estate litigation", "beneficiary dispute",
+    "trust", "will", "estate", "inheritance", "executor",
+    "trustee", "beneficiary", "decedent", "probate court"
+)
+# Phrases that contain a shorter keyword (e.g. "trust litigation" contains "trust")
+# can never change the result, so only the minimal root keywords are matched
+TRUST_WILL_ROOT_KEYWORDS = tuple(
+    keyword for keyword in TRUST_WILL_KEYWORDS
+    if not any(other != keyword and other in keyword for other in TRUST_WILL_KEYWORDS)
+)
 
 # Helper functions
 def requires_auth(f):
@@ -29,24 +131,101 @@ def requires_auth(f):
         return f(*args, **kwargs)
     return decorated
 
+def get_db_pool():
+    """Return the shared Postgres connection pool, creating it on first use"""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ThreadedConnectionPool(
+                    DB_POOL_MIN_CONN,
+                    DB_POOL_MAX_CONN,
+                    os.environ.get("DATABASE_URL")
+                )
+    return _db_pool
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled Postgres connection and hand it back when done"""
+    pool = get_db_pool()
+    # Pooled connections go stale after a Postgres restart or idle disconnect, and
+    # getconn() hands out idle connections before opening new ones. Keep probing and
+    # discarding until one answers; once the dead idle ones are gone the pool connects
+    # afresh, so the loop is bounded by the pool size.
+    for _ in range(DB_POOL_MAX_CONN + 1):
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            break
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            logger.warning("Discarding stale pooled database connection")
+            pool.putconn(conn, close=True)
+    else:
+        raise psycopg2.OperationalError("No live database connection available from the pool")
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+def get_cached_clio_token():
+    """Return the cached Clio token if it is still within its TTL"""
+    token = _clio_token_cache["token"]
+    if token and time.monotonic() - _clio_token_cache["cached_at"] < CLIO_TOKEN_CACHE_TTL:
+        return token
+    return None
+
+def cache_clio_token(token):
+    """Store (or with None, invalidate) the in-process Clio token"""
+    _clio_token_cache["token"] = token
+    _clio_token_cache["cached_at"] = time.monotonic()
+
+def clio_breaker_open():
+    """Return True while the Clio circuit breaker is tripped"""
+    with _clio_breaker_lock:
+        if _clio_breaker["failures"] < CLIO_BREAKER_THRESHOLD:
+            return False
+        if time.monotonic() - _clio_breaker["opened_at"] >= CLIO_BREAKER_RESET_SECONDS:
+            # Half-open: let this caller probe Clio and hold everyone else for another window
+            _clio_breaker["opened_at"] = time.monotonic()
+            return False
+        return True
+
+def record_clio_result(ok):
+    """Feed one Clio call outcome into the circuit breaker"""
+    with _clio_breaker_lock:
+        if ok:
+            _clio_breaker["failures"] = 0
+        else:
+            _clio_breaker["failures"] += 1
+            if _clio_breaker["failures"] >= CLIO_BREAKER_THRESHOLD:
+                _clio_breaker["opened_at"] = time.monotonic()
+
+def clio_post(url, **kwargs):
+    """POST to the Clio API through the shared session, tracking failures for the breaker"""
+    try:
+        response = clio_session.post(url, **kwargs)
+    except requests.exceptions.RequestException:
+        record_clio_result(False)
+        raise
+    record_clio_result(response.status_code < 500)
+    return response
+
 def refresh_clio_token():
     """Automatically refresh expired Clio OAuth token"""
     try:
-        # Get refresh token from database
-        db_url = os.environ.get("DATABASE_URL")
-        conn = psycopg2.connect(db_url)
-        cursor = conn.cursor()
-        cursor.execute("SELECT refresh_token FROM api_configs WHERE service = 'clio' AND refresh_token IS NOT NULL LIMIT 1")
-        result = cursor.fetchone()
+        # Get refresh token from database (connection goes back to the pool before the HTTP call)
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT refresh_token FROM api_configs WHERE service = 'clio' AND refresh_token IS NOT NULL LIMIT 1")
+                result = cursor.fetchone()
 
         if not result or not result[0]:
-            print("❌ No refresh token found in database")
-            cursor.close()
-            conn.close()
+            logger.error("❌ No refresh token found in database")
             return None
 
         refresh_token = result[0]
-        print(f"🔄 Refreshing Clio token using refresh token...")
+        logger.info("🔄 Refreshing Clio token using refresh token...")
 
         # Request new access token using refresh token
         token_data = {
@@ -56,7 +235,7 @@ def refresh_clio_token():
             'client_secret': CLIO_CLIENT_SECRET
         }
 
-        response = requests.post(CLIO_TOKEN_URL, data=token_data, timeout=10)
+        response = clio_session.post(CLIO_TOKEN_URL, data=token_data, timeout=(CLIO_CONNECT_TIMEOUT, 10))
 
         if response.status_code == 200:
             token_info = response.json()
@@ -64,103 +243,118 @@ def refresh_clio_token():
             new_refresh_token = token_info.get('refresh_token', refresh_token)  # Use new refresh token if provided
 
             # Update tokens in database
-            cursor.execute(
-                "UPDATE api_configs SET oauth_token = %s, refresh_token = %s, updated_at = NOW() WHERE service = 'clio'",
-                (new_access_token, new_refresh_token)
-            )
-            conn.commit()
+            with db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "UPDATE api_configs SET oauth_token = %s, refresh_token = %s, updated_at = NOW() WHERE service = 'clio'",
+                        (new_access_token, new_refresh_token)
+                    )
+                conn.commit()
 
-            # Also update session
+            # Also update session and the in-process cache
             session['clio_token'] = new_access_token
+            cache_clio_token(new_access_token)
             session['clio_refresh_token'] = new_refresh_token
 
-            print(f"✅ Successfully refreshed Clio token")
-            cursor.close()
-            conn.close()
+            logger.info("✅ Successfully refreshed Clio token")
             return new_access_token
         else:
-            print(f"❌ Failed to refresh token: {response.status_code} - {response.text}")
-            cursor.close()
-            conn.close()
+            logger.error("❌ Failed to refresh token: %s - %s", response.status_code, response.text)
+            # The cached access token is known to be rejected; drop it
+            cache_clio_token(None)
             return None
 
-    except Exception as e:
-        print(f"❌ Error refreshing Clio token: {str(e)}")
+    except Exception:
+        logger.exception("❌ Error refreshing Clio token")
         return None
 
-def extract_practice_area(description):
-    """Extract practice area from description text - ONLY for Trust/Will Litigation"""
+def split_name(name):
+    """Split a full name into (first name, last name) at the first whitespace run"""
+    name_parts = name.split(None, 1) if name else []
+    if not name_parts:
+        return "", ""
+    # Collapse tabs and repeated spaces inside the last name, as a full split() would
+    return name_parts[0], " ".join(name_parts[1].split()) if len(name_parts) > 1 else ""
+
+def extract_practice_area(description, description_lower=None):
+    """Extract practice area from description text - ONLY for Trust/Will Litigation
+
+    Callers that already lowercased the text can pass it as description_lower.
+    """
     if not description:
         return "Other"
 
-    description_lower = description.lower()
+    if description_lower is None:
+        description_lower = description.lower()
 
-    # Check ONLY for trust/will litigation keywords
-    trust_will_keywords = [
-        "trust litigation", "will litigation", "contest will", "contest trust",
-        "contested will", "contested trust", "trust contest", "will contest",
-        "vested rights", "trustee removal", "trust termination", 
-        "probate", "estate litigation", "beneficiary dispute",
-        "trust", "will", "estate", "inheritance", "executor", 
-        "trustee", "beneficiary", "decedent", "probate court"
-    ]
-
-    for keyword in trust_will_keywords:
-        if keyword in description_lower:
-            return "Trust/Will Litigation"
+    # Check ONLY for trust/will litigation keywords. Plain substring checks run in
+    # CPython's native string search and beat a regex alternation on long transcripts.
+    if any(keyword in description_lower for keyword in TRUST_WILL_ROOT_KEYWORDS):
+        return "Trust/Will Litigation"
 
     # If no trust/will keywords found, return "Other"
     return "Other"
 
-def extract_matter_description(transcription):
-    """Extract brief matter description: matter type and location only"""
+# Matter type keywords for extract_matter_description, in priority order
+MATTER_TYPE_KEYWORDS = (
+    (("trust litigation",), "Trust litigation"),
+    (("will contest", "contested will"), "Will contest"),
+    (("estate litigation",), "Estate litigation"),
+    (("probate",), "Probate"),
+    (("trust",), "Trust matter"),
+    (("will",), "Will matter"),
+    (("personal injury", "accident"), "Personal injury"),
+    (("divorce",), "Divorce"),
+    (("custody",), "Child custody"),
+    (("criminal",), "Criminal matter"),
+)
+
+# State/location keywords for extract_matter_description, in priority order
+STATE_KEYWORDS = {
+    'california': 'California',
+    'ca': 'California',
+    'texas': 'Texas',
+    'tx': 'Texas',
+    'florida': 'Florida',
+    'fl': 'Florida',
+    'new york': 'New York',
+    'ny': 'New York',
+    'ariz ona': 'Arizona',
+    'az': 'Arizona',
+    'nevada': 'Nevada',
+    'nv': 'Nevada',
+}
+STATE_NAMES = tuple(dict.fromkeys(STATE_KEYWORDS.values()))
+# One alternation for all states so the (lowercased) transcription is scanned once
+STATE_PATTERN = re.compile(r'\b(?:' + '|'.join(re.escape(keyword) for keyword in STATE_KEYWORDS) + r')\b')
+
+def extract_matter_description(transcription, transcription_lower=None):
+    """Extract brief matter description: matter type and location only
+
+    Callers that already lowercased the text can pass it as transcription_lower.
+    """
     if not transcription:
         return ""
-    
-    import re
-    text_lower = transcription.lower()
+
+    text_lower = transcription_lower if transcription_lower is not None else transcription.lower()
+    return describe_matter(text_lower)[0]
+
+def describe_matter(text_lower):
+    """Return (brief matter description, matched matter type keyword or None) for lowercased text"""
     parts = []
+    matched_keyword = None
     
-    # Extract matter type
-    if "trust litigation" in text_lower:
-        parts.append("Trust litigation")
-    elif "will contest" in text_lower or "contested will" in text_lower:
-        parts.append("Will contest")
-    elif "estate litigation" in text_lower:
-        parts.append("Estate litigation")
-    elif "probate" in text_lower:
-        parts.append("Probate")
-    elif "trust" in text_lower:
-        parts.append("Trust matter")
-    elif "will" in text_lower:
-        parts.append("Will matter")
-    elif "personal injury" in text_lower or "accident" in text_lower:
-        parts.append("Personal injury")
-    elif "divorce" in text_lower:
-        parts.append("Divorce")
-    elif "custody" in text_lower:
-        parts.append("Child custody")
-    elif "criminal" in text_lower:
-        parts.append("Criminal matter")
-    
-    # Extract state/location
-    state_patterns = [
-        (r'\bcalifornia\b', 'California'),
-        (r'\bCA\b', 'California'),
-        (r'\btexas\b', 'Texas'),
-        (r'\bTX\b', 'Texas'),
-        (r'\bflorida\b', 'Florida'),
-        (r'\bFL\b', 'Florida'),
-        (r'\bnew york\b', 'New York'),
-        (r'\bNY\b', 'New York'),
-        (r'\bariz ona\b', 'Arizona'),
-        (r'\bAZ\b', 'Arizona'),
-        (r'\bnevada\b', 'Nevada'),
-        (r'\bNV\b', 'Nevada'),
-    ]
+    # Extract matter type (first entry in priority order with a keyword present)
+    for keywords, matter_type in MATTER_TYPE_KEYWORDS:
+        matched_keyword = next((keyword for keyword in keywords if keyword in text_lower), None)
+        if matched_keyword:
+            parts.append(matter_type)
+            break
     
-    for pattern, state_name in state_patterns:
-        if re.search(pattern, transcription, re.IGNORECASE):
+    # Extract state/location (first state in priority order that is mentioned)
+    mentioned_states = {STATE_KEYWORDS[match.group(0)] for match in STATE_PATTERN.finditer(text_lower)}
+    for state_name in STATE_NAMES:
+        if state_name in mentioned_states:
             parts.append(state_name)
             break
     
@@ -176,7 +370,50 @@ def extract_matter_description(transcription):
     if len(description) > 255:
         description = description[:252] + "..."
     
-    return description
+    return description, matched_keyword
+
+# Case type keywords for parse_transcription_to_case_summary, in priority order
+CASE_TYPE_KEYWORDS = (
+    (("trust contest", "contested trust"), "Trust Contest"),
+    (("will contest", "contested will"), "Will Contest"),
+    (("trustee removal",), "Trustee Removal"),
+    (("trust termination",), "Trust Termination"),
+    (("vested rights",), "Vested Rights"),
+    (("probate",), "Probate"),
+    (("trust litigation",), "Trust Litigation"),
+    (("will litigation",), "Will Litigation"),
+    (("trust",), "Trust Matter"),
+    (("will",), "Will Matter"),
+)
+
+# Case summary patterns for parse_transcription_to_case_summary, compiled once at import
+# Value patterns run against the lowercased transcription
+ESTATE_VALUE_PATTERNS = [
+    re.compile(r"estate\s+(?:value|worth|is|of)\s+(?:approximately|about|around)?\s*\$?([\d,]+(?:\.\d+)?)\s*(?:million|mil|m|k|thousand)?"),
+    re.compile(r"\$?([\d,]+(?:\.\d+)?)\s*(?:million|mil|m)\s+estate"),
+    re.compile(r"estate.*\$?([\d,]+(?:\.\d+)?)\s*(?:million|mil|m|k)")
+]
+SHARE_VALUE_PATTERNS = [
+    re.compile(r"share\s+(?:value|worth|is|of)\s+(?:approximately|about|around)?\s*\$?([\d,]+(?:\.\d+)?)\s*(?:million|mil|m|k|thousand)?"),
+    re.compile(r"beneficiary.*\$?([\d,]+(?:\.\d+)?)\s*(?:million|mil|m|k)")
+]
+# Unit markers shared by the estate and share value extraction
+MILLION_MARKERS = ('million', ' mil', ' m')
+THOUSAND_MARKERS = ('thousand', ' k')
+# Name and case number patterns run against the original-case transcription
+DECEDENT_PATTERNS = [
+    re.compile(r"decedent['\s]+(?:name\s+is\s+|was\s+)?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)"),
+    re.compile(r"(?:my|the)\s+(?:late\s+)?(?:mother|father|parent|grandmother|grandfather|spouse|husband|wife|aunt|uncle|brother|sister)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)"),
+    re.compile(r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+(?:passed away|died|death)")
+]
+TRUSTEE_PATTERNS = [
+    re.compile(r"trustee['\s]+(?:name\s+is\s+|is\s+)?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)"),
+    re.compile(r"executor['\s]+(?:name\s+is\s+|is\s+)?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)")
+]
+CASE_NUMBER_PATTERNS = [
+    re.compile(r"case\s+(?:number|no|#)\s*[:.]?\s*([A-Z0-9-]+)"),
+    re.compile(r"court\s+case\s+([A-Z0-9-]+)")
+]
 
 def parse_transcription_to_case_summary(transcription):
     """
@@ -194,53 +431,26 @@ def parse_transcription_to_case_summary(transcription):
     if not transcription:
         return ""
 
-    import re
-
     transcription_lower = transcription.lower()
     summary_parts = []
 
-    # 1. Extract case type
-    case_type = None
-    if "trust contest" in transcription_lower or "contested trust" in transcription_lower:
-        case_type = "Trust Contest"
-    elif "will contest" in transcription_lower or "contested will" in transcription_lower:
-        case_type = "Will Contest"
-    elif "trustee removal" in transcription_lower:
-        case_type = "Trustee Removal"
-    elif "trust termination" in transcription_lower:
-        case_type = "Trust Termination"
-    elif "vested rights" in transcription_lower:
-        case_type = "Vested Rights"
-    elif "probate" in transcription_lower:
-        case_type = "Probate"
-    elif "trust litigation" in transcription_lower:
-        case_type = "Trust Litigation"
-    elif "will litigation" in transcription_lower:
-        case_type = "Will Litigation"
-    elif "trust" in transcription_lower:
-        case_type = "Trust Matter"
-    elif "will" in transcription_lower:
-        case_type = "Will Matter"
-
-    if case_type:
-        summary_parts.append(case_type)
+    # 1. Extract case type (first entry in priority order with a keyword present)
+    for keywords, case_type in CASE_TYPE_KEYWORDS:
+        if any(keyword in transcription_lower for keyword in keywords):
+            summary_parts.append(case_type)
+            break
 
     # 2. Extract estate value
-    estate_value_patterns = [
-        r"estate\s+(?:value|worth|is|of)\s+(?:approximately|about|around)?\s*\$?([\d,]+(?:\.\d+)?)\s*(?:million|mil|m|k|thousand)?",
-        r"\$?([\d,]+(?:\.\d+)?)\s*(?:million|mil|m)\s+estate",
-        r"estate.*\$?([\d,]+(?:\.\d+)?)\s*(?:million|mil|m|k)"
-    ]
-
     estate_value = None
-    for pattern in estate_value_patterns:
-        match = re.search(pattern, transcription_lower)
+    for pattern in ESTATE_VALUE_PATTERNS:
+        match = pattern.search(transcription_lower)
         if match:
             value = match.group(1).replace(',', '')
+            matched_text = match.group(0)
             # Check if it mentions million
-            if 'million' in match.group(0) or ' mil' in match.group(0) or ' m' in match.group(0):
+            if any(marker in matched_text for marker in MILLION_MARKERS):
                 estate_value = f"${value}M estate"
-            elif 'thousand' in match.group(0) or ' k' in match.group(0):
+            elif any(marker in matched_text for marker in THOUSAND_MARKERS):
                 estate_value = f"${value}K estate"
             else:
                 # Try to determine if it's millions based on context
@@ -258,32 +468,22 @@ def parse_transcription_to_case_summary(transcription):
         summary_parts.append(estate_value)
 
     # 3. Extract beneficiary share value
-    share_patterns = [
-        r"share\s+(?:value|worth|is|of)\s+(?:approximately|about|around)?\s*\$?([\d,]+(?:\.\d+)?)\s*(?:million|mil|m|k|thousand)?",
-        r"beneficiary.*\$?([\d,]+(?:\.\d+)?)\s*(?:million|mil|m|k)"
-    ]
-
-    for pattern in share_patterns:
-        match = re.search(pattern, transcription_lower)
+    for pattern in SHARE_VALUE_PATTERNS:
+        match = pattern.search(transcription_lower)
         if match:
             value = match.group(1).replace(',', '')
-            if 'million' in match.group(0) or ' mil' in match.group(0) or ' m' in match.group(0):
+            matched_text = match.group(0)
+            if any(marker in matched_text for marker in MILLION_MARKERS):
                 summary_parts.append(f"${value}M share")
-            elif 'thousand' in match.group(0) or ' k' in match.group(0):
+            elif any(marker in matched_text for marker in THOUSAND_MARKERS):
                 summary_parts.append(f"${value}K share")
             break
 
     # 4. Extract decedent name and date
     # Look for "decedent" or "deceased" followed by a name
-    decedent_patterns = [
-        r"decedent['\s]+(?:name\s+is\s+|was\s+)?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
-        r"(?:my|the)\s+(?:late\s+)?(?:mother|father|parent|grandmother|grandfather|spouse|husband|wife|aunt|uncle|brother|sister)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
-        r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+(?:passed away|died|death)"
-    ]
-
     decedent_name = None
-    for pattern in decedent_patterns:
-        match = re.search(pattern, transcription)  # Use original case for names
+    for pattern in DECEDENT_PATTERNS:
+        match = pattern.search(transcription)  # Use original case for names
         if match:
             decedent_name = match.group(1)
             break
@@ -292,26 +492,16 @@ def parse_transcription_to_case_summary(transcription):
         summary_parts.append(f"Re: {decedent_name}")
 
     # 5. Extract trustee/executor name
-    trustee_patterns = [
-        r"trustee['\s]+(?:name\s+is\s+|is\s+)?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
-        r"executor['\s]+(?:name\s+is\s+|is\s+)?([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)"
-    ]
-
-    for pattern in trustee_patterns:
-        match = re.search(pattern, transcription)
+    for pattern in TRUSTEE_PATTERNS:
+        match = pattern.search(transcription)
         if match:
             trustee_name = match.group(1)
             summary_parts.append(f"Trustee: {trustee_name}")
             break
 
     # 6. Extract court case number
-    case_number_patterns = [
-        r"case\s+(?:number|no|#)\s*[:.]?\s*([A-Z0-9-]+)",
-        r"court\s+case\s+([A-Z0-9-]+)"
-    ]
-
-    for pattern in case_number_patterns:
-        match = re.search(pattern, transcription)
+    for pattern in CASE_NUMBER_PATTERNS:
+        match = pattern.search(transcription)
         if match:
             case_num = match.group(1)
             summary_parts.append(f"Case: {case_num}")
@@ -334,6 +524,24 @@ def parse_transcription_to_case_summary(transcription):
         fallback = transcription[:250] + "..." if len(transcription) > 250 else transcription
         return fallback
 
+def analyze_transcription(transcription):
+    """Extract (brief matter description, practice area) from a transcription
+
+    Lowercases the transcription once for both extractors, and skips the practice
+    area keyword scan when the matter type keyword already contains a trust/will one.
+    """
+    if not transcription:
+        return "", extract_practice_area(transcription)
+
+    transcription_lower = transcription.lower()
+    brief_description, matched_keyword = describe_matter(transcription_lower)
+    # The matched keyword is in the text, so any root keyword inside it is too
+    if matched_keyword and any(keyword in matched_keyword for keyword in TRUST_WILL_ROOT_KEYWORDS):
+        practice_area = "Trust/Will Litigation"
+    else:
+        practice_area = extract_practice_area(transcription, transcription_lower)
+    return brief_description, practice_area
+
 # Routes
 @app.route('/')
 def index():
@@ -344,22 +552,11 @@ def index():
     if 'clio_token' in session:
         clio_token = session['clio_token']
     else:
-        # Then check database
-        try:
-            import psycopg2
-            db_url = os.environ.get("DATABASE_URL")
-            conn = psycopg2.connect(db_url)
-            cursor = conn.cursor()
-            cursor.execute("SELECT oauth_token FROM api_configs WHERE service = 'clio' AND oauth_token IS NOT NULL")
-            result = cursor.fetchone()
-            if result and result[0]:
-                clio_token = result[0]
-                # Also populate session
-                session['clio_token'] = result[0]
-            cursor.close()
-            conn.close()
-        except Exception as e:
-            print(f"Error checking database for token: {e}")
+        # Then check the in-process cache / database
+        clio_token = get_token_from_db()
+        if clio_token:
+            # Also populate session
+            session['clio_token'] = clio_token
 
     return f"""
     <html>
@@ -410,13 +607,7 @@ def index():
 @app.route('/authorize')
 def authorize():
     """Redirect to Clio OAuth authorization"""
-    auth_params = {
-        'response_type': 'code',
-        'client_id': CLIO_CLIENT_ID,
-        'redirect_uri': CLIO_REDIRECT_URI
-    }
-    auth_url = f"{CLIO_AUTH_URL}?response_type={auth_params['response_type']}&client_id={auth_params['client_id']}&redirect_uri={auth_params['redirect_uri']}"
-    return redirect(auth_url)
+    return redirect(CLIO_AUTHORIZE_URL)
 
 @app.route('/api/clio-callback')
 def clio_callback():
@@ -435,7 +626,7 @@ def clio_callback():
     }
 
     try:
-        response = requests.post(CLIO_TOKEN_URL, data=token_data)
+        response = clio_session.post(CLIO_TOKEN_URL, data=token_data, timeout=(CLIO_CONNECT_TIMEOUT, 10))
         if response.status_code == 200:
             token_info = response.json()
             access_token = token_info.get('access_token')
@@ -447,31 +638,24 @@ def clio_callback():
 
             # Also store in database
             try:
-                db_url = os.environ.get("DATABASE_URL")
-                conn = psycopg2.connect(db_url)
-                cursor = conn.cursor()
-
-                # Check if record exists
-                cursor.execute("SELECT id FROM api_configs WHERE service = 'clio'")
-                exists = cursor.fetchone()
-
-                if exists:
-                    cursor.execute(
-                        "UPDATE api_configs SET oauth_token = %s, refresh_token = %s, updated_at = NOW() WHERE service = 'clio'",
-                        (access_token, refresh_token)
-                    )
-                else:
-                    cursor.execute(
-                        "INSERT INTO api_configs (service, oauth_token, refresh_token) VALUES ('clio', %s, %s)",
-                        (access_token, refresh_token)
-                    )
-
-                conn.commit()
-                cursor.close()
-                conn.close()
-                print("✅ Token successfully saved to database")
-            except Exception as e:
-                print(f"❌ Error saving token to database: {e}")
+                with db_connection() as conn:
+                    with conn.cursor() as cursor:
+                        # Single upsert (relies on the unique index from create_indexes.py)
+                        cursor.execute(
+                            """INSERT INTO api_configs
+                               (service, oauth_token, refresh_token, is_active, created_at, updated_at)
+                               VALUES ('clio', %s, %s, TRUE, NOW(), NOW())
+                               ON CONFLICT (service) DO UPDATE
+                               SET oauth_token = EXCLUDED.oauth_token,
+                                   refresh_token = EXCLUDED.refresh_token,
+                                   updated_at = NOW()""",
+                            (access_token, refresh_token)
+                        )
+                    conn.commit()
+                cache_clio_token(access_token)
+                logger.info("✅ Token successfully saved to database")
+            except Exception:
+                logger.exception("❌ Error saving token to database")
 
             return redirect('/')
         else:
@@ -492,14 +676,14 @@ def test_clio():
     }
 
     try:
-        response = requests.get(f"{CLIO_API_BASE}/users/who_am_i", headers=headers, timeout=10)
+        response = clio_session.get(f"{CLIO_API_BASE}/users/who_am_i", headers=headers, timeout=(CLIO_CONNECT_TIMEOUT, 10))
 
         if response.status_code == 401:
             # Try to refresh token
             new_token = refresh_clio_token()
             if new_token:
                 headers["Authorization"] = f"Bearer {new_token}"
-                response = requests.get(f"{CLIO_API_BASE}/users/who_am_i", headers=headers, timeout=10)
+                response = clio_session.get(f"{CLIO_API_BASE}/users/who_am_i", headers=headers, timeout=(CLIO_CONNECT_TIMEOUT, 10))
             else:
                 return jsonify({"error": "Token expired and refresh failed"}), 401
 
@@ -511,18 +695,24 @@ def test_clio():
         return jsonify({"error": str(e)}), 500
 
 def get_token_from_db():
-    """Helper function to get token from database"""
+    """Helper function to get token from database (served from the in-process cache while fresh)"""
+    cached_token = get_cached_clio_token()
+    if cached_token:
+        return cached_token
+
     try:
-        db_url = os.environ.get("DATABASE_URL")
-        conn = psycopg2.connect(db_url)
-        cursor = conn.cursor()
-        cursor.execute("SELECT oauth_token FROM api_configs WHERE service = 'clio' AND oauth_token IS NOT NULL LIMIT 1")
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return result[0] if result else None
-    except Exception as e:
-        print(f"Error getting token from database: {e}")
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT oauth_token FROM api_configs WHERE service = 'clio' AND oauth_token IS NOT NULL LIMIT 1")
+                result = cursor.fetchone()
+        token = result[0] if result else None
+        if token:
+            cache_clio_token(token)
+        return token
+    except Exception:
+        # db_connection discards dead pooled connections until one answers SELECT 1,
+        # so a failure here means Postgres is unreachable or the query itself failed
+        logger.exception("Error getting token from database")
         return None
 
 @app.route('/api/ghl-webhook-live', methods=['POST'])
@@ -532,36 +722,34 @@ def ghl_webhook_live():
     # 🔐 Verify that the lead token exists
     lead_token = os.environ.get("CLIO_GROW_INBOX_TOKEN")
     if not lead_token:
-        print("❌ Missing CLIO_GROW_INBOX_TOKEN in environment (runtime)")
+        logger.error("❌ Missing CLIO_GROW_INBOX_TOKEN in environment (runtime)")
         return jsonify({"error": "Clio Grow inbox token not configured"}), 500
 
-    # Prepare headers for Clio Grow API
-    headers = {
-        "Authorization": f"Bearer {lead_token}",
-        "Content-Type": "application/json"
-    }
-
     try:
-        # Get JSON data from GoHighLevel
-        data = request.get_json()
+        # Get JSON data from GoHighLevel (parsed once; malformed bodies become {})
+        data = request.get_json(cache=True, silent=True) or {}
 
-        print("=" * 50)
-        print("📥 Received webhook from GoHighLevel (LIVE)")
-        print(f"Full payload: {json.dumps(data, indent=2)}")
-        print("=" * 50)
+        logger.info("📥 Received webhook from GoHighLevel (LIVE)")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Full payload: %s", json.dumps(data, indent=2))
 
         # Extract contact information
         # GHL sends first_name and last_name separately
         first_name = data.get('first_name', '')
         last_name = data.get('last_name', '')
+
+        # Validate required fields before doing any transcript work
+        if not first_name and not last_name:
+            return jsonify({"error": "First or last name is required"}), 400
         
-        email = data.get('email', data.get('contact', {}).get('email', ''))
-        phone = data.get('phone', data.get('contact', {}).get('phone', ''))
+        contact = data.get('contact') or {}
+        email = data.get('email', contact.get('email', ''))
+        phone = data.get('phone', contact.get('phone', ''))
 
         # Extract transcription
         transcription = data.get('transcription', '')
         if not transcription and 'customData' in data:
-            transcription = data.get('customData', {}).get('transcription', '')
+            transcription = (data['customData'] or {}).get('transcription', '')
 
         # Extract brief description (matter type + location) 
         brief_description = extract_matter_description(transcription)
@@ -576,22 +764,10 @@ def ghl_webhook_live():
         else:
             from_message = "Lead from Law Leaders call"
 
-        print(f"📋 Extracted Info:")
-        print(f"  First Name: {first_name}")
-        print(f"  Last Name: {last_name}")
-        print(f"  Email: {email}")
-        print(f"  Phone: {phone}")
-        print(f"  Brief Description: {brief_description}")
-        print(f"  Message Length: {len(from_message)} chars")
-
-        # Validate required fields
-        if not first_name and not last_name:
-            return jsonify({"error": "First or last name is required"}), 400
-
-        # Get Clio Grow inbox token
-        inbox_token = os.environ.get('CLIO_GROW_INBOX_TOKEN')
-        if not inbox_token:
-            return jsonify({"error": "Clio Grow inbox token not configured"}), 500
+        logger.debug(
+            "📋 Extracted Info: first_name=%s last_name=%s email=%s phone=%s brief_description=%s message_length=%d",
+            first_name, last_name, email, phone, brief_description, len(from_message)
+        )
 
         # Prepare Clio Grow Lead Inbox API payload
         grow_payload = {
@@ -604,74 +780,79 @@ def ghl_webhook_live():
                 "referring_url": "https://app.lawleaders.com",
                 "from_source": "Law Leaders Call"
             },
-            "inbox_lead_token": inbox_token
+            "inbox_lead_token": lead_token
         }
 
-        print("\n🔄 Sending lead to Clio Grow...")
-        print(f"📤 Payload: {json.dumps(grow_payload, indent=2)}")
+        logger.info("🔄 Sending lead to Clio Grow...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📤 Payload: %s", json.dumps(grow_payload, indent=2))
 
         # Send to Clio Grow Lead Inbox API
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-
-        response = requests.post(
+        response = clio_session.post(
             "https://grow.clio.com/inbox_leads",
             json=grow_payload,
-            headers=headers,
-            timeout=20
+            timeout=CLIO_TIMEOUT
         )
 
-        print(f"📥 Clio Grow response status: {response.status_code}")
-        print(f"📥 Clio Grow response: {response.text}")
+        # Decode the body once; it is printed and then parsed or echoed back
+        response_text = response.text
+        logger.info("📥 Clio Grow response status: %s", response.status_code)
+        logger.debug("📥 Clio Grow response: %s", response_text)
 
         if response.status_code == 201:
-            print("✅ Successfully created lead in Clio Grow")
+            logger.info("✅ Successfully created lead in Clio Grow")
             return jsonify({
                 "status": "success",
                 "message": "Lead forwarded to Clio Grow",
-                "clio_grow_response": response.json()
+                "clio_grow_response": json.loads(response_text)
             }), 200
         else:
-            print(f"❌ Failed to create lead in Clio Grow: {response.status_code}")
+            logger.error("❌ Failed to create lead in Clio Grow: %s - %s", response.status_code, response_text)
             return jsonify({
                 "status": "error",
                 "message": "Failed to forward lead to Clio Grow",
-                "error": response.text
+                "error": response_text
             }), response.status_code
 
     except Exception as e:
-        print(f"❌ Exception in webhook: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Exception in webhook")
         return jsonify({"error": f"Exception: {str(e)}"}), 500
 
 @app.route('/webhook/gohighlevel', methods=['POST'])
 def gohighlevel_webhook():
     """Main webhook endpoint for GoHighLevel"""
     try:
-        # Get JSON data from GoHighLevel
-        data = request.get_json()
+        # Get JSON data from GoHighLevel (parsed once; malformed bodies become {})
+        data = request.get_json(cache=True, silent=True) or {}
 
-        print("=" * 50)
-        print("📥 Received webhook from GoHighLevel")
-        print(f"Full payload: {json.dumps(data, indent=2)}")
-        print("=" * 50)
+        logger.info("📥 Received webhook from GoHighLevel")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Full payload: %s", json.dumps(data, indent=2))
 
         # Extract contact information
-        name = data.get('name', data.get('contact', {}).get('name', ''))
-        email = data.get('email', data.get('contact', {}).get('email', ''))
-        phone = data.get('phone', data.get('contact', {}).get('phone', ''))
-        state = data.get('state', data.get('contact', {}).get('state', ''))
+        contact = data.get('contact') or {}
+        name = data.get('name', contact.get('name', ''))
+        email = data.get('email', contact.get('email', ''))
+        phone = data.get('phone', contact.get('phone', ''))
+        state = data.get('state', contact.get('state', ''))
+
+        # Validate required fields and auth before doing any transcript work
+        if not name:
+            return jsonify({"error": "Name is required"}), 400
+
+        # Get Clio token
+        token = session.get('clio_token') or get_token_from_db()
+        if not token:
+            return jsonify({"error": "Not authenticated with Clio"}), 401
 
         # Extract transcription for case description
         transcription = data.get('transcription', '')
         if not transcription and 'customData' in data:
-            transcription = data.get('customData', {}).get('transcription', '')
+            transcription = (data['customData'] or {}).get('transcription', '')
 
-        # Extract brief description (matter type + location) for Clio description field
-        brief_description = extract_matter_description(transcription)
+        # Extract brief description (matter type + location) for Clio description field,
+        # together with the practice area, in one pass over the transcription
+        brief_description, practice_area = analyze_transcription(transcription)
         
         # FORCE truncation to be safe - Clio has 255 char limit
         if brief_description and len(brief_description) > 255:
@@ -684,39 +865,27 @@ def gohighlevel_webhook():
         # Keep full transcription for Clio notes (65K char limit)
         full_transcription = transcription
 
-        # Extract practice area based on transcription
-        practice_area = extract_practice_area(transcription)
-
-        print(f"📋 Extracted Info:")
-        print(f"  Name: {name}")
-        print(f"  Email: {email}")
-        print(f"  Phone: {phone}")
-        print(f"  State: {state}")
-        print(f"  Practice Area: {practice_area}")
-        print(f"  Brief Description ({len(brief_description)} chars): {brief_description}")
-        print(f"  Full Transcription Length: {len(full_transcription)} chars")
-
-        # Validate required fields
-        if not name:
-            return jsonify({"error": "Name is required"}), 400
-
-        # Get Clio token
-        token = session.get('clio_token') or get_token_from_db()
-        if not token:
-            return jsonify({"error": "Not authenticated with Clio"}), 401
+        logger.debug(
+            "📋 Extracted Info: name=%s email=%s phone=%s state=%s practice_area=%s "
+            "brief_description=%s (%d chars) transcription_length=%d",
+            name, email, phone, state, practice_area,
+            brief_description, len(brief_description), len(full_transcription)
+        )
 
         # Step 1: Create contact in Clio
-        print("\n🔄 Creating contact in Clio...")
+        logger.info("🔄 Creating contact in Clio...")
         contact_result = create_clio_contact(name, email, phone, state, token)
 
         if "error" in contact_result:
-            print(f"❌ Contact creation failed: {contact_result}")
+            logger.error("❌ Contact creation failed: %s", contact_result)
             return jsonify(contact_result), 400
 
-        print(f"✅ Contact created: {json.dumps(contact_result, indent=2)}")
+        logger.info("✅ Contact created")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Contact result: %s", json.dumps(contact_result, indent=2))
 
         # Step 2: Create matter in Clio with brief description and full transcription note
-        print("\n🔄 Creating matter in Clio...")
+        logger.info("🔄 Creating matter in Clio...")
         matter_result = create_clio_matter(
             contact_result, 
             practice_area, 
@@ -726,13 +895,15 @@ def gohighlevel_webhook():
         )
 
         if "error" in matter_result:
-            print(f"❌ Matter creation failed: {matter_result}")
+            logger.error("❌ Matter creation failed: %s", matter_result)
             return jsonify({
                 "contact": contact_result,
                 "matter_error": matter_result
             }), 400
 
-        print(f"✅ Matter created: {json.dumps(matter_result, indent=2)}")
+        logger.info("✅ Matter created")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Matter result: %s", json.dumps(matter_result, indent=2))
 
         # Return success response
         return jsonify({
@@ -746,36 +917,33 @@ def gohighlevel_webhook():
         }), 200
 
     except Exception as e:
-        print(f"❌ Exception in webhook: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Exception in webhook")
         return jsonify({"error": f"Exception: {str(e)}"}), 500
 
 def create_clio_contact(name, email=None, phone=None, state=None, token=None):
     """Create a contact in Clio"""
-    import requests
-    import json
-    from flask import session
 
     # Get authentication token
     auth_token = token or session.get('clio_token', '')
     if not auth_token:
         return {"error": "No Clio authentication token available"}
 
+    if clio_breaker_open():
+        return {"error": "Clio API unavailable (circuit breaker open); try again shortly"}
+
     # Set up the request
-    contacts_url = f"{CLIO_API_BASE}/contacts"
     headers = {
         "Authorization": f"Bearer {auth_token}",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
+        "Content-Type": "application/json"
     }
 
     # Build contact data
+    first_name, last_name = split_name(name)
     contact_data = {
         "data": {
             "type": "Person",
-            "first_name": name.split()[0] if name else "",
-            "last_name": " ".join(name.split()[1:]) if len(name.split()) > 1 else ""
+            "first_name": first_name,
+            "last_name": last_name
         }
     }
 
@@ -808,73 +976,75 @@ def create_clio_contact(name, email=None, phone=None, state=None, token=None):
         ]
 
     try:
-        print("Sending contact creation request to Clio API...")
-        print(f"Request data: {json.dumps(contact_data, indent=2)}")
-
-        response = requests.post(
-            contacts_url,
+        # Serialize once; the body is reused for the retry and the debug log
+        contact_body = json.dumps(contact_data)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sending contact creation request to Clio API...")
+            logger.debug("Request data: %s", contact_body)
+
+        response = clio_post(
+            CLIO_CONTACTS_URL,
             headers=headers,
-            json=contact_data,
-            timeout=20
+            data=contact_body,
+            timeout=CLIO_TIMEOUT
         )
 
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text[:200]}...")  # First 200 chars
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response status: %s (%.3fs)", response.status_code, response.elapsed.total_seconds())
+            logger.debug("Response body: %.200s...", response.text)  # First 200 chars
 
         if response.status_code in [200, 201]:
-            print("Successfully created contact in Clio")
+            logger.info("✅ Successfully created contact in Clio")
             return response.json()
         elif response.status_code == 401:
             # Token expired - try to refresh automatically
-            print("🔄 Token expired (401), attempting auto-refresh...")
+            logger.warning("🔄 Token expired (401), attempting auto-refresh...")
             new_token = refresh_clio_token()
 
             if new_token:
                 # Retry with new token
-                print("🔄 Retrying contact creation with refreshed token...")
+                logger.info("🔄 Retrying contact creation with refreshed token...")
                 headers["Authorization"] = f"Bearer {new_token}"
-                retry_response = requests.post(
-                    contacts_url,
+                retry_response = clio_post(
+                    CLIO_CONTACTS_URL,
                     headers=headers,
-                    json=contact_data,
-                    timeout=20
+                    data=contact_body,
+                    timeout=CLIO_TIMEOUT
                 )
 
                 if retry_response.status_code in [200, 201]:
-                    print("✅ Successfully created contact after token refresh")
+                    logger.info("✅ Successfully created contact after token refresh")
                     return retry_response.json()
                 else:
-                    print(f"❌ Failed even after token refresh. Status: {retry_response.status_code}")
+                    logger.error("❌ Failed even after token refresh. Status: %s", retry_response.status_code)
                     return {
                         "error": f"Failed to create contact even after token refresh. Status: {retry_response.status_code}",
                         "response_body": retry_response.text,
                         "request_data": contact_data
                     }
             else:
-                print("❌ Could not refresh token")
+                logger.error("❌ Could not refresh token")
                 return {
                     "error": "Token expired and could not be refreshed automatically",
                     "response_body": response.text,
                     "request_data": contact_data
                 }
         else:
-            print(f"❌ Failed to create contact in Clio. Status: {response.status_code}")
-            print(f"❌ Response: {response.text}")
+            logger.error("❌ Failed to create contact in Clio. Status: %s", response.status_code)
+            response_text = response.text
+            logger.error("❌ Response: %s", response_text[:512])  # full body is returned to the caller
             return {
                 "error": f"Failed to create contact in Clio API. Status: {response.status_code}",
-                "response_body": response.text,
+                "response_body": response_text,
                 "request_data": contact_data
             }
 
     except Exception as e:
-        print(f"Exception when creating contact: {str(e)}")
+        logger.exception("Exception when creating contact")
         return {"error": f"Exception when creating contact: {str(e)}"}
 
 def create_clio_matter(contact_data, practice_area, description, full_transcription="", token=None):
     """Create a matter in Clio and add full transcription as a note"""
-    import requests
-    import json
-    from flask import session
 
     # Extract contact ID
     contact_id = contact_data.get("data", {}).get("id")
@@ -886,24 +1056,23 @@ def create_clio_matter(contact_data, practice_area, description, full_transcript
     if not auth_token:
         return {"error": "No Clio authentication token available"}
 
+    if clio_breaker_open():
+        return {"error": "Clio API unavailable (circuit breaker open); try again shortly"}
+
     # Set up headers
     headers = {
         "Authorization": f"Bearer {auth_token}",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
+        "Content-Type": "application/json"
     }
 
     # Ensure description is under 255 characters (Clio's limit)
     if description and len(description) > 255:
         description = description[:252] + "..."
 
-    # Use the correct Clio API format - based on their documentation
-    matter_data = {
+    # Payload for the contact-scoped endpoint (client is implied by the URL)
+    contact_matter_data = {
         "data": {
             "type": "Matter",
-            "client": {
-                "id": str(contact_id)
-            },
             "display_number": f"GHL-{contact_id}",
             "description": description if description else "",
             "status": "Open",
@@ -911,28 +1080,58 @@ def create_clio_matter(contact_data, practice_area, description, full_transcript
         }
     }
 
-    try:
-        print(f"📤 Creating matter with data: {json.dumps(matter_data, indent=2)}")
-        print(f"📏 Description length: {len(description)} characters")
+    # Use the correct Clio API format - based on their documentation
+    # (same fields, plus the client reference)
+    matter_data = {
+        "data": {
+            **contact_matter_data["data"],
+            "client": {
+                "id": str(contact_id)
+            }
+        }
+    }
 
-        response = requests.post(
-            f"{CLIO_API_BASE}/matters",
+    try:
+        if _matter_endpoint_state["prefer_contact_scoped"]:
+            # The standard endpoint failed last time; go straight to the one that worked
+            logger.info("🔄 Using contact-scoped endpoint: /contacts/%s/matters", contact_id)
+            preferred_response = clio_post(
+                CLIO_CONTACT_MATTERS_URL.format(contact_id=contact_id),
+                headers=headers,
+                json=contact_matter_data,
+                timeout=CLIO_TIMEOUT
+            )
+            if preferred_response.status_code in [200, 201]:
+                logger.info("✅ Successfully created matter via contact-scoped endpoint")
+                return preferred_response.json()
+            logger.warning("⚠️ Contact-scoped endpoint failed (%s), falling back to /matters", preferred_response.status_code)
+            _matter_endpoint_state["prefer_contact_scoped"] = False
+
+        # Serialize once; the body is reused for the retry and the debug log
+        matter_body = json.dumps(matter_data)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📤 Creating matter with data: %s", matter_body)
+            logger.debug("📏 Description length: %d characters", len(description))
+
+        response = clio_post(
+            CLIO_MATTERS_URL,
             headers=headers,
-            json=matter_data,
-            timeout=20
+            data=matter_body,
+            timeout=CLIO_TIMEOUT
         )
 
-        print(f"📥 Matter creation response status: {response.status_code}")
-        print(f"📥 Matter creation response: {response.text}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📥 Matter creation response status: %s (%.3fs)", response.status_code, response.elapsed.total_seconds())
+            logger.debug("📥 Matter creation response: %s", response.text)
 
         if response.status_code in [200, 201]:
-            print("✅ Successfully created matter in Clio")
+            logger.info("✅ Successfully created matter in Clio")
             matter_result = response.json()
             matter_id = matter_result.get("data", {}).get("id")
             
             # Create a note with the full transcription if available
             if full_transcription and matter_id:
-                print(f"📝 Adding full transcription as note ({len(full_transcription)} chars)...")
+                logger.debug("📝 Adding full transcription as note (%d chars)...", len(full_transcription))
                 note_data = {
                     "data": {
                         "type": "Matter",
@@ -944,76 +1143,73 @@ def create_clio_matter(contact_data, practice_area, description, full_transcript
                     }
                 }
                 
-                note_response = requests.post(
-                    f"{CLIO_API_BASE}/notes",
+                note_response = clio_post(
+                    CLIO_NOTES_URL,
                     headers=headers,
                     json=note_data,
-                    timeout=20
+                    timeout=CLIO_TIMEOUT
                 )
                 
                 if note_response.status_code in [200, 201]:
-                    print("✅ Successfully added transcription note to matter")
+                    logger.info("✅ Successfully added transcription note to matter")
                 else:
-                    print(f"⚠️ Failed to add note: {note_response.status_code} - {note_response.text}")
+                    logger.warning("⚠️ Failed to add note: %s - %s", note_response.status_code, note_response.text[:512])
             
             return matter_result
         elif response.status_code == 401:
             # Token expired - try to refresh automatically
-            print("🔄 Token expired (401), attempting auto-refresh...")
+            logger.warning("🔄 Token expired (401), attempting auto-refresh...")
             new_token = refresh_clio_token()
 
             if new_token:
                 # Retry with new token
-                print("🔄 Retrying matter creation with refreshed token...")
+                logger.info("🔄 Retrying matter creation with refreshed token...")
                 headers["Authorization"] = f"Bearer {new_token}"
-                retry_response = requests.post(
-                    f"{CLIO_API_BASE}/matters",
+                retry_response = clio_post(
+                    CLIO_MATTERS_URL,
                     headers=headers,
-                    json=matter_data,
-                    timeout=20
+                    data=matter_body,
+                    timeout=CLIO_TIMEOUT
                 )
 
                 if retry_response.status_code in [200, 201]:
-                    print("✅ Successfully created matter after token refresh")
+                    logger.info("✅ Successfully created matter after token refresh")
                     return retry_response.json()
                 else:
-                    print(f"❌ Failed even after token refresh. Status: {retry_response.status_code}")
+                    logger.error("❌ Failed even after token refresh. Status: %s", retry_response.status_code)
                     return {
                         "error": f"Failed to create matter even after token refresh. Status: {retry_response.status_code}",
                         "response_body": retry_response.text,
                         "contact_id": contact_id
                     }
             else:
-                print("❌ Could not refresh token")
+                logger.error("❌ Could not refresh token")
                 return {
                     "error": "Token expired and could not be refreshed automatically",
                     "response_body": response.text,
                     "contact_id": contact_id
                 }
-        else:
-            # If this format fails, try the alternative endpoint
-            print("🔄 Trying alternative endpoint: /contacts/{id}/matters")
+        elif response.status_code in CLIO_MATTER_FALLBACK_STATUSES:
+            # The endpoint is missing or erroring; try the alternative endpoint
+            logger.warning("🔄 /matters returned %s, trying alternative endpoint: /contacts/%s/matters", response.status_code, contact_id)
 
-            alternative_response = requests.post(
-                f"{CLIO_API_BASE}/contacts/{contact_id}/matters",
+            alternative_response = clio_post(
+                CLIO_CONTACT_MATTERS_URL.format(contact_id=contact_id),
                 headers=headers,
-                json={
-                    "data": {
-                        "type": "Matter",
-                        "display_number": f"GHL-{contact_id}",
-                        "description": description if description else "",
-                        "status": "Open",
-                        "practice_area": practice_area or "General"
-                    }
-                },
-                timeout=20
+                json=contact_matter_data,
+                timeout=CLIO_TIMEOUT
             )
 
-            print(f"📥 Alternative response status: {alternative_response.status_code}")
-            print(f"📥 Alternative response: {alternative_response.text}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("📥 Alternative response status: %s", alternative_response.status_code)
+                logger.debug("📥 Alternative response: %s", alternative_response.text)
 
             if alternative_response.status_code in [200, 201]:
-                print("✅ Successfully created matter via alternative endpoint")
+                logger.info("✅ Successfully created matter via alternative endpoint")
+                # Only a 404 means /matters is missing for this account; a 5xx is
+                # transient, so keep trying the standard endpoint first next time
+                if response.status_code == 404:
+                    _matter_endpoint_state["prefer_contact_scoped"] = True
                 return alternative_response.json()
 
             return {
@@ -1022,12 +1218,19 @@ def create_clio_matter(contact_data, practice_area, description, full_transcript
                 "alternative_response": alternative_response.text,
                 "contact_id": contact_id
             }
+        else:
+            logger.error("❌ Failed to create matter in Clio. Status: %s", response.status_code)
+            return {
+                "error": f"Failed to create matter. Status: {response.status_code}",
+                "response_body": response.text,
+                "contact_id": contact_id
+            }
 
     except Exception as e:
-        print(f"❌ Exception creating matter: {str(e)}")
+        logger.exception("❌ Exception creating matter")
         return {"error": f"Exception creating matter: {str(e)}"}
 
 # Main entry point
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
 
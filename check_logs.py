@@ -44,32 +44,27 @@ def show_recent_transactions(hours=24):
         
         print("=" * 80)
         
-        # Get error count
+        # Get recent errors and the total error count in one round trip
         cursor.execute(
-            """SELECT COUNT(*) FROM error_logs WHERE created_at > %s""",
+            """SELECT id, transaction_id, error_type, error_message, created_at,
+                     COUNT(*) OVER () AS error_count
+              FROM error_logs 
+              WHERE created_at > %s
+              ORDER BY created_at DESC
+              LIMIT 5""",
             (time_threshold,)
         )
         
-        error_count = cursor.fetchone()[0]
+        errors = cursor.fetchall()
+        error_count = errors[0][5] if errors else 0
         print(f"Errors in the last {hours} hours: {error_count}")
         
         if error_count > 0:
-            # Get recent errors
-            cursor.execute(
-                """SELECT id, transaction_id, error_type, error_message, created_at 
-                  FROM error_logs 
-                  WHERE created_at > %s
-                  ORDER BY created_at DESC
-                  LIMIT 5""",
-                (time_threshold,)
-            )
-            
-            errors = cursor.fetchall()
             print("\nMost recent errors:")
             print("-" * 80)
             
             for e in errors:
-                e_id, t_id, e_type, message, created = e
+                e_id, t_id, e_type, message, created, _ = e
                 print(f"Error ID: {e_id} | Transaction: {t_id} | {created}")
                 print(f"Type: {e_type}")
                 print(f"Message: {message[:150]}..." if len(message) > 150 else f"Message: {message}")
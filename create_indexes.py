@@ -0,0 +1,46 @@
+import os
+import psycopg2
+
+# Indexes the app relies on. models.py cannot create them (it is not imported
+# by the running app), so existing databases get them from this script.
+INDEXES = [
+    # clio_callback upserts tokens with ON CONFLICT (service)
+    """CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS api_configs_service_key
+       ON api_configs (service)""",
+    # check_logs.py reads both log tables by a created_at time window
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_created_at
+       ON transactions (created_at)""",
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_error_logs_created_at
+       ON error_logs (created_at)""",
+]
+
+def create_indexes():
+    """Create any missing indexes without locking the tables against writes"""
+    db_url = os.environ.get("DATABASE_URL")
+
+    if not db_url:
+        print("DATABASE_URL environment variable not set")
+        return False
+
+    try:
+        # Connect to the database
+        conn = psycopg2.connect(db_url)
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.autocommit = True
+        cursor = conn.cursor()
+
+        for statement in INDEXES:
+            print(f"Running: {' '.join(statement.split())}")
+            cursor.execute(statement)
+
+        print("All indexes are in place")
+        cursor.close()
+        conn.close()
+        return True
+
+    except Exception as e:
+        print(f"Error creating indexes: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    create_indexes()
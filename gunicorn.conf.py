@@ -0,0 +1,21 @@
+# gunicorn.conf.py
+# Picked up automatically by gunicorn from the working directory
+import os
+
+# Webhooks spend most of their time waiting on Clio, so run threaded workers
+# instead of the default single synchronous worker.
+# Each worker keeps one Postgres connection per thread (see DB_POOL_MAX_CONN in
+# app.py), so workers x threads must stay below the server's max_connections
+# (100 by default). cpu_count() reports the host's cores inside containers, so
+# the worker count is a small fixed default rather than derived from it.
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+
+# Without SECRET_KEY each worker signs sessions with its own random key, and the
+# Clio token stored in the session is lost whenever a request lands elsewhere
+if workers > 1 and not os.environ.get("SECRET_KEY"):
+    raise RuntimeError("SECRET_KEY must be set when running more than one gunicorn worker")
+
+# Keep client connections open across webhook deliveries
+keepalive = 65